@@ -15,11 +15,17 @@ from .validation import (
     validate_map,
     validate_enum,
     validate_struct,
+    compile_struct,
+    prepare_schema,
+    clear_schema_cache,
+    CompiledSchema,
 )
 from .types import (
     find_struct,
     find_enum,
     get_struct_fields,
+    clear_field_cache,
+    SchemaError,
 )
 
 __all__ = [
@@ -33,8 +39,14 @@ __all__ = [
     "validate_map",
     "validate_enum",
     "validate_struct",
+    "compile_struct",
+    "prepare_schema",
+    "clear_schema_cache",
+    "CompiledSchema",
     "find_struct",
     "find_enum",
     "get_struct_fields",
+    "clear_field_cache",
+    "SchemaError",
 ]
 
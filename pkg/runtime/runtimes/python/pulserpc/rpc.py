@@ -6,9 +6,14 @@ from typing import Any
 class RPCError(Exception):
     """Exception class for JSON-RPC errors"""
     
+    # BaseException instances keep a __dict__, but the declared fields are
+    # stored in slots and read without a dict lookup
+    __slots__ = ('code', 'message', 'data')
+    
     def __init__(self, code: int, message: str, data: Any = None):
         self.code = code
         self.message = message
         self.data = data
+        # Formatted once; str() returns args[0] as-is
         super().__init__(f"RPCError {code}: {message}")
 
@@ -1,6 +1,18 @@
 """Helper functions for working with type definitions"""
 
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, List, Optional, Tuple
+
+
+# Resolved fields of every struct in a schema, keyed by id(all_structs). Each
+# entry holds a reference to the schema dict so its id cannot be reused while
+# cached. At most _MAX_FIELDS_CACHE schemas are kept; the oldest is dropped
+# when full.
+_FIELDS_CACHE: Dict[int, Tuple[Dict[str, Any], Dict[str, List[Dict[str, Any]]]]] = {}
+_MAX_FIELDS_CACHE = 32
+
+
+class SchemaError(ValueError):
+    """Raised when a schema cannot be resolved, e.g. a cyclic extends chain"""
 
 
 def find_struct(struct_name: str, all_structs: Dict[str, Any]) -> Optional[Dict[str, Any]]:
@@ -14,30 +26,84 @@ def find_enum(enum_name: str, all_enums: Dict[str, Any]) -> Optional[Dict[str, A
 
 
 def get_struct_fields(struct_name: str, all_structs: Dict[str, Any]) -> List[Dict[str, Any]]:
-    """Recursively resolve struct extends to return all fields (parent + child)"""
-    struct_def = find_struct(struct_name, all_structs)
-    if not struct_def:
-        return []
-    
-    fields = []
-    
-    # Get parent fields first
-    if struct_def.get('extends'):
-        parent_fields = get_struct_fields(struct_def['extends'], all_structs)
-        fields.extend(parent_fields)
-    
-    # Add child fields (override parent if name conflict)
-    field_names = {f['name'] for f in fields}
-    for field in struct_def.get('fields', []):
-        if field['name'] not in field_names:
-            fields.append(field)
-            field_names.add(field['name'])
+    """Resolve struct extends to return all fields (parent + child)
+
+    Results are cached per schema, so the schema is treated as immutable once
+    resolved. The returned list is shared between callers and must not be
+    modified. Raises SchemaError if the struct's extends chain is cyclic.
+    """
+    entry = _FIELDS_CACHE.get(id(all_structs))
+    if entry is None:
+        entry = (all_structs, resolve_extends(all_structs))
+        if len(_FIELDS_CACHE) >= _MAX_FIELDS_CACHE:
+            del _FIELDS_CACHE[next(iter(_FIELDS_CACHE))]
+        _FIELDS_CACHE[id(all_structs)] = entry
+    fields = entry[1].get(struct_name)
+    if fields is None:
+        if struct_name not in all_structs:
+            return []
+        # Either the struct's extends chain is cyclic or it was added to the
+        # schema after the cached resolution, so resolve the schema again
+        resolved = resolve_extends(all_structs)
+        _FIELDS_CACHE[id(all_structs)] = (all_structs, resolved)
+        fields = resolved.get(struct_name)
+        if fields is None:
+            raise extends_cycle_error(struct_name, all_structs)
+    return fields
+
+
+def clear_field_cache() -> None:
+    """Discard all cached struct field lists"""
+    _FIELDS_CACHE.clear()
+
+
+def resolve_extends(all_structs: Dict[str, Any]) -> Dict[str, List[Dict[str, Any]]]:
+    """Resolve the fields of every struct in a schema in one pass
+
+    Structs are ordered so each parent comes before the structs extending it
+    (a topological sort of the extends graph), letting each struct's fields
+    be built from its parent's already-resolved list. The result maps struct
+    names to field lists in that order. Structs whose extends chain is cyclic
+    are left out; extends_cycle_error describes them.
+    """
+    # Each struct extends at most one parent, so ordering reduces to a
+    # breadth-first walk from the structs that extend nothing in the schema
+    children: Dict[str, List[str]] = {}
+    order: List[str] = []
+    for name, struct_def in all_structs.items():
+        parent = struct_def.get('extends') if struct_def else None
+        if parent and find_struct(parent, all_structs):
+            children.setdefault(parent, []).append(name)
         else:
-            # Override parent field
-            for i, f in enumerate(fields):
-                if f['name'] == field['name']:
-                    fields[i] = field
-                    break
+            order.append(name)
+    for name in order:
+        order.extend(children.pop(name, ()))
     
-    return fields
+    resolved: Dict[str, List[Dict[str, Any]]] = {}
+    for name in order:
+        struct_def = all_structs[name]
+        parent = struct_def.get('extends') if struct_def else None
+        # A child field replaces its parent's field in place, since dict
+        # assignment to an existing key keeps its insertion position
+        merged: Dict[str, Dict[str, Any]] = {}
+        if parent in resolved:
+            merged.update((field['name'], field) for field in resolved[parent])
+        if struct_def:
+            for field in struct_def.get('fields', []):
+                merged[field['name']] = field
+        resolved[name] = list(merged.values())
+    return resolved
+
+
+def extends_cycle_error(struct_name: str, all_structs: Dict[str, Any]) -> SchemaError:
+    """Build the error for a struct whose extends chain is cyclic
 
+    Only the structs on the cycle itself are named, not those extending it.
+    """
+    chain: List[str] = []
+    name: str = struct_name
+    while name not in chain:
+        chain.append(name)
+        name = all_structs[name]['extends']
+    cycle = chain[chain.index(name):] + [name]
+    return SchemaError(f"Struct {struct_name} has a cyclic extends chain: {' -> '.join(cycle)}")
@@ -1,64 +1,248 @@
 """Validation functions for PulseRPC types"""
 
-from typing import Any, Callable, Dict, List
+import re
+from typing import AbstractSet, Any, Callable, Collection, Dict, FrozenSet, List, Optional, Set, Tuple
 
-from .types import find_struct, find_enum, get_struct_fields
+from .types import SchemaError, clear_field_cache, extends_cycle_error, get_struct_fields
+
+
+# How a compiled validator is called:
+#   _LEAF:   validator(value), for built-in and enum values
+#   _NODE:   validator(value, path, stack), for arrays and maps that cannot
+#            hold a struct; called in place and never touches the stack
+#   _NESTED: validator(value, path, stack), for arrays and maps that can hold
+#            structs; called in place, pushing the structs onto the stack
+#   _STRUCT: validator(value, path, stack), for structs, pushed onto the work stack
+# Only struct references can make a value nest arbitrarily deep, so arrays and
+# maps are checked in place (bounded by the depth of the type definition) while
+# struct values are deferred to the explicit stack driven by _run.
+_LEAF = 0
+_NODE = 1
+_NESTED = 2
+_STRUCT = 3
+
+# Passed as the stack to _NODE validators run outside _run; they never push to it
+_NO_STACK: List[Any] = []
+
+# Compiled type definitions kept per schema; the oldest is dropped when full
+_MAX_COMPILED_TYPES = 256
+
+# A work stack entry: (value, validator, segments), where segments is the path
+# from the pushing struct to the value. An entry with no validator marks the
+# end of the value with the given id, and repeats its segments so they can be
+# removed from the path again. Entries only hold their own few segments, so the
+# stack stays linear in the depth of the value.
+StackEntry = Tuple[Any, Optional[Callable[..., None]], Tuple[Any, ...]]
+
+
+class CompiledSchema:
+    """Validation data for a schema (ALL_STRUCTS and ALL_ENUMS), resolved as it is used
+
+    Structs and enums are resolved the first time a validated type reaches
+    them, so validating one type only compiles the structs it can contain.
+    A strict schema also rejects struct values containing fields that are not
+    declared on the struct.
+    """
+    
+    def __init__(self, all_structs: Dict[str, Any], all_enums: Dict[str, Any], strict: bool = False):
+        self.all_structs = all_structs
+        self.all_enums = all_enums
+        self.strict = strict
+        # User-defined type name -> (validator, kind), so a user-defined value
+        # is validated with one lookup and one call
+        self.resolved_types: Dict[str, Tuple[Callable[..., None], int]] = {}
+        # The generated struct functions share one namespace. Each struct's
+        # function name is assigned when the struct is first referenced, so
+        # references to it are bound by name and resolved when called.
+        self.namespace: Dict[str, Any] = dict(_STRUCT_GLOBALS)
+        self.function_names: Dict[str, str] = {}
+        # Struct name -> function name, for structs referenced but not yet compiled
+        self.pending: Dict[str, str] = {}
+        # Struct name -> public validator returned by compile_struct, created on first use
+        self.struct_validators: Dict[str, Callable[[Any], None]] = {}
+        # id(type_def) -> (type_def, validator, kind) for validate_type. Each
+        # entry holds its type definition so the id cannot be reused while cached.
+        self.compiled_types: Dict[int, Tuple[Dict[str, Any], Callable[..., None], int]] = {}
+
+
+# Prepared schemas keyed by (id(all_structs), id(all_enums), strict). Each schema
+# holds references to its dicts so their ids cannot be reused while cached.
+# Schemas are treated as immutable once prepared. At most _MAX_SCHEMAS are
+# kept; the oldest is dropped to make room for a new one.
+_SCHEMAS: Dict[Tuple[int, int, bool], CompiledSchema] = {}
+_MAX_SCHEMAS = 32
+
+
+def prepare_schema(all_structs: Dict[str, Any], all_enums: Dict[str, Any], strict: bool = False) -> CompiledSchema:
+    """Return the CompiledSchema for a schema, creating it on first use
+
+    Each struct and enum is snapshotted when first used: later changes to it
+    are not seen until clear_schema_cache() is called. Callers validating
+    against many short-lived schemas can keep the returned CompiledSchema (or
+    a compile_struct validator) instead of relying on the cache.
+    A struct whose extends chain is cyclic raises SchemaError when it is
+    validated; the rest of the schema can still be used.
+    """
+    key = (id(all_structs), id(all_enums), strict)
+    schema = _SCHEMAS.get(key)
+    if schema is None:
+        schema = CompiledSchema(all_structs, all_enums, strict)
+        if len(_SCHEMAS) >= _MAX_SCHEMAS:
+            del _SCHEMAS[next(iter(_SCHEMAS))]
+        _SCHEMAS[key] = schema
+    return schema
+
+
+def clear_schema_cache() -> None:
+    """Discard all prepared schemas, e.g. after modifying a schema's dicts"""
+    _SCHEMAS.clear()
+    clear_field_cache()
+
+
+def _type_error(expected: str, value: Any) -> TypeError:
+    """Build the error for a value of the wrong type
+
+    Validators only call this once a check has failed, keeping message
+    formatting off the success path.
+    """
+    return TypeError(f"Expected {expected}, got {type(value).__name__}")
 
 
 def validate_string(value: Any) -> None:
     """Validate that value is a string"""
-    if not isinstance(value, str):
-        raise TypeError(f"Expected string, got {type(value).__name__}")
+    if type(value) is not str:
+        raise _type_error('string', value)
 
 
 def validate_int(value: Any) -> None:
     """Validate that value is an int"""
-    if not isinstance(value, int):
-        raise TypeError(f"Expected int, got {type(value).__name__}")
+    # Exact type check: bool is a subclass of int but is not a valid int
+    if type(value) is not int:
+        raise _type_error('int', value)
 
 
 def validate_float(value: Any) -> None:
     """Validate that value is a float or int"""
-    if not isinstance(value, (int, float)):
-        raise TypeError(f"Expected float, got {type(value).__name__}")
+    t = type(value)
+    if t is not float and t is not int:
+        raise _type_error('float', value)
 
 
 def validate_bool(value: Any) -> None:
     """Validate that value is a bool"""
-    if not isinstance(value, bool):
-        raise TypeError(f"Expected bool, got {type(value).__name__}")
+    if type(value) is not bool:
+        raise _type_error('bool', value)
+
+
+# Built-in type name -> validator
+_BUILTIN: Dict[str, Callable[[Any], None]] = {
+    'string': validate_string,
+    'int': validate_int,
+    'float': validate_float,
+    'bool': validate_bool,
+}
+
+# Built-in validator -> the exact types it accepts, for checking all of an
+# array's elements or a map's values with a single C-level pass over map(type, ...)
+_SCALAR_TYPES: Dict[Callable[..., None], FrozenSet[type]] = {
+    validate_string: frozenset((str,)),
+    validate_int: frozenset((int,)),
+    validate_float: frozenset((float, int)),
+    validate_bool: frozenset((bool,)),
+}
+_STRING_TYPES = _SCALAR_TYPES[validate_string]
+
+
+def validate_array(value: Any, element_validator: Callable[..., None], *args: Any) -> None:
+    """Validate that value is an array and each element passes validation
+
+    Each element is passed to element_validator followed by args, so callers
+    can pass a shared validator instead of allocating a closure per call.
+    """
+    path: List[Any] = []
+    try:
+        _check_array(value, element_validator, args, path)
+    except (TypeError, ValueError) as e:
+        _raise_at(path, e)
+
+
+def validate_map(value: Any, value_validator: Callable[..., None], *args: Any) -> None:
+    """Validate that value is a map (dict) with string keys and validated values
 
+    Each value is passed to value_validator followed by args.
+    """
+    path: List[Any] = []
+    try:
+        _check_map(value, value_validator, args, path)
+    except (TypeError, ValueError) as e:
+        _raise_at(path, e)
 
-def validate_array(value: Any, element_validator: Callable[[Any], None]) -> None:
-    """Validate that value is an array and each element passes validation"""
-    if not isinstance(value, list):
-        raise TypeError(f"Expected list, got {type(value).__name__}")
+
+def _check_array(value: Any, element_validator: Callable[..., None], args: Tuple[Any, ...], path: List[Any]) -> None:
+    """Validate an array, recording the index being validated in path"""
+    # Subclasses are accepted, but the exact type is checked first as the common case
+    if type(value) is not list and not isinstance(value, list):
+        raise _type_error('list', value)
+    if not value:
+        return
+    # Arrays of built-in values are checked with one C-level pass over the
+    # element types, falling back to the loop below to locate a failing element
+    element_types = _SCALAR_TYPES.get(element_validator)
+    if element_types is not None and element_types.issuperset(map(type, value)):
+        return
+    # Left in place if an element fails, so the boundary can report it
+    path.append(0)
     for i, elem in enumerate(value):
-        try:
-            element_validator(elem)
-        except Exception as e:
-            raise ValueError(f"Array element at index {i} validation failed: {e}") from e
+        path[-1] = i
+        element_validator(elem, *args)
+    path.pop()
 
 
-def validate_map(value: Any, value_validator: Callable[[Any], None]) -> None:
-    """Validate that value is a map (dict) with string keys and validated values"""
-    if not isinstance(value, dict):
-        raise TypeError(f"Expected dict, got {type(value).__name__}")
+def _check_map(value: Any, value_validator: Callable[..., None], args: Tuple[Any, ...], path: List[Any]) -> None:
+    """Validate a map, recording the key being validated in path"""
+    if type(value) is not dict and not isinstance(value, dict):
+        raise _type_error('dict', value)
+    if not value:
+        return
+    # Keys are checked in one pass; the offending key is only looked up on failure
+    if not _STRING_TYPES.issuperset(map(type, value)):
+        key = next(k for k in value if type(k) is not str)
+        raise TypeError(f"Map key must be string, got {type(key).__name__}")
+    # Maps of built-in values are checked the same way, falling back to the
+    # loop below to locate the failing value
+    value_types = _SCALAR_TYPES.get(value_validator)
+    if value_types is not None and value_types.issuperset(map(type, value.values())):
+        return
+    path.append(None)
     for key, val in value.items():
-        if not isinstance(key, str):
-            raise TypeError(f"Map key must be string, got {type(key).__name__}")
-        try:
-            value_validator(val)
-        except Exception as e:
-            raise ValueError(f"Map value for key '{key}' validation failed: {e}") from e
+        path[-1] = key
+        value_validator(val, *args)
+    path.pop()
+
+
+def _raise_at(path: List[Any], error: Exception) -> None:
+    """Re-raise a validation error, prefixed with the JSON pointer of the failing value
+
+    A SchemaError is a fault in the schema rather than the value, so it is
+    re-raised unchanged.
+    """
+    if not path or isinstance(error, SchemaError):
+        raise error
+    pointer = ''.join('/' + str(p).replace('~', '~0').replace('/', '~1') for p in path)
+    raise ValueError(f"Invalid value at {pointer}: {error}") from error
+
 
+def validate_enum(value: Any, enum_name: str, allowed_values: Collection[str]) -> None:
+    """Validate that value is a string and matches one of the allowed enum values
 
-def validate_enum(value: Any, enum_name: str, allowed_values: List[str]) -> None:
-    """Validate that value is a string and matches one of the allowed enum values"""
-    if not isinstance(value, str):
-        raise TypeError(f"Expected string for enum {enum_name}, got {type(value).__name__}")
+    The error lists allowed_values in order, or sorted if it is a set.
+    """
+    # str subclasses (e.g. str-based Enum members) compare equal to their values
+    if type(value) is not str and not isinstance(value, str):
+        raise _type_error(f'string for enum {enum_name}', value)
     if value not in allowed_values:
-        raise ValueError(f"Invalid value for enum {enum_name}: '{value}'. Allowed values: {allowed_values}")
+        listed = sorted(allowed_values) if isinstance(allowed_values, AbstractSet) else list(allowed_values)
+        raise ValueError(f"Invalid value for enum {enum_name}: '{value}'. Allowed values: {listed}")
 
 
 def validate_struct(
@@ -66,37 +250,326 @@ def validate_struct(
     struct_name: str,
     struct_def: Dict[str, Any],
     all_structs: Dict[str, Any],
-    all_enums: Dict[str, Any]
+    all_enums: Dict[str, Any],
+    strict: bool = False
 ) -> None:
-    """Validate that value is a dict matching the struct definition"""
-    if not isinstance(value, dict):
-        raise TypeError(f"Expected dict for struct {struct_name}, got {type(value).__name__}")
-    
-    # Get all fields including parent fields
-    fields = get_struct_fields(struct_name, all_structs)
-    
-    # Check required fields
-    for field in fields:
-        field_name = field['name']
-        field_type = field['type']
-        is_optional = field.get('optional', False)
-        
-        if field_name not in value:
-            if not is_optional:
-                raise ValueError(f"Missing required field '{field_name}' in struct {struct_name}")
-        else:
-            # Field is present, validate it
-            field_value = value[field_name]
-            if field_value is None:
-                if not is_optional:
-                    raise ValueError(f"Field '{field_name}' in struct {struct_name} cannot be None")
+    """Validate that value is a dict matching the struct definition
+
+    If strict is True, fields not declared on the struct are rejected.
+    The schema is snapshotted on first use; see prepare_schema.
+    """
+    compile_struct(struct_name, all_structs, all_enums, strict)(value)
+
+
+def compile_struct(
+    struct_name: str,
+    all_structs: Dict[str, Any],
+    all_enums: Dict[str, Any],
+    strict: bool = False
+) -> Callable[[Any], None]:
+    """Compile a struct definition into a single specialized validator function.
+
+    The fields (including inherited ones) are resolved once and inlined into
+    generated source, so validating a value does not re-walk the schema.
+    The result is cached per schema and struct name.
+    """
+    schema = prepare_schema(all_structs, all_enums, strict)
+    validator = schema.struct_validators.get(struct_name)
+    if validator is not None:
+        return validator
+
+    if all_structs.get(struct_name):
+        node, kind = _compile_reachable({'userDefined': struct_name}, schema)
+        if kind != _STRUCT:
+            raise extends_cycle_error(struct_name, all_structs)
+    else:
+        # An undefined struct has no fields, so only the value's type is checked
+        node = _compile_structs(schema, {struct_name: '_validate_undefined'}, dict(_STRUCT_GLOBALS))[struct_name]
+
+    def validate(value: Any) -> None:
+        path: List[Any] = []
+        try:
+            _run(value, node, path)
+        except (TypeError, ValueError) as e:
+            _raise_at(path, e)
+
+    schema.struct_validators[struct_name] = validate
+    return validate
+
+
+def _compile_structs(
+    schema: CompiledSchema,
+    func_names: Dict[str, str],
+    namespace: Dict[str, Any]
+) -> Dict[str, Callable[[Any, List[Any], List[StackEntry]], None]]:
+    """Generate the work-stack validator functions for structs into namespace
+
+    func_names maps each struct to compile to the global name of its
+    function. Structs are taken from it until it is empty, so structs first
+    referenced by the fields being compiled are compiled in the same pass.
+    Each field's validator is bound as the global
+    <function>_v<field>; struct-valued fields refer to the other struct's
+    function by its global name instead. Built-in, enum, array and map
+    fields are checked in place; struct-valued fields are pushed onto the
+    stack, last first, so they are validated in field order once this
+    struct's own fields have passed.
+    Returns the function generated for each struct.
+    """
+    compiled: Dict[str, str] = {}
+    lines: List[str] = []
+    while func_names:
+        struct_name = next(iter(func_names))
+        func_name = compiled[struct_name] = func_names.pop(struct_name)
+        fields = get_struct_fields(struct_name, schema.all_structs)
+        namespace[f'{func_name}_name'] = struct_name
+        namespace[f'{func_name}_expected'] = f'dict for struct {struct_name}'
+        namespace[f'{func_name}_known'] = frozenset(field['name'] for field in fields)
+        lines.append(f"def {func_name}(v, path, stack):")
+        lines.append("    if type(v) is not dict and not isinstance(v, dict):")
+        lines.append(f"        raise _type_error({func_name}_expected, v)")
+        if schema.strict:
+            lines.append(f"    if not {func_name}_known.issuperset(v):")
+            lines.append(f"        raise _unknown_field(v, {func_name}_known, {func_name}_name)")
+        deferred = []
+        for i, field in enumerate(fields):
+            field_name = field['name']
+            is_optional = field.get('optional', False)
+            validator, kind = _compile_type(field['type'], schema)
+            if i == 0:
+                lines.append(f"    path.append({field_name!r})")
+            else:
+                lines.append(f"    path[-1] = {field_name!r}")
+            # A single get() both checks presence and fetches the value; the
+            # missing and None cases are only told apart on the error path
+            x = f"x{i}" if kind == _STRUCT else "x"
+            lines.append(f"    {x} = v.get({field_name!r})")
+            if kind == _STRUCT:
+                deferred.append((i, field_name, is_optional, schema.function_names[field['type']['userDefined']]))
+                call = None
             else:
-                # Create validator for this field type
-                field_validator = lambda v: validate_type(v, field_type, all_structs, all_enums, is_optional)
-                try:
-                    field_validator(field_value)
-                except Exception as e:
-                    raise ValueError(f"Field '{field_name}' in struct {struct_name} validation failed: {e}") from e
+                namespace[f'{func_name}_v{i}'] = validator
+                call = f"{func_name}_v{i}(x)" if kind == _LEAF else f"{func_name}_v{i}(x, path, stack)"
+            if is_optional:
+                if call is not None:
+                    lines.append("    if x is not None:")
+                    lines.append(f"        {call}")
+            else:
+                lines.append(f"    if {x} is None:")
+                lines.append(f"        raise _missing_or_none(v, {field_name!r}, {func_name}_name, path)")
+                if call is not None:
+                    lines.append(f"    {call}")
+        if fields:
+            lines.append("    path.pop()")
+        # Struct functions start with an empty path (see _run), so a field's
+        # segments are just its name
+        for i, field_name, is_optional, target in deferred[::-1]:
+            push = f"stack.append((x{i}, {target}, ({field_name!r},)))"
+            if is_optional:
+                lines.append(f"    if x{i} is not None:")
+                lines.append(f"        {push}")
+            else:
+                lines.append(f"    {push}")
+        lines.append("")
+
+    exec(compile("\n".join(lines), "<pulserpc structs>", "exec"), namespace)
+    return {name: namespace[func_name] for name, func_name in compiled.items()}
+
+
+def _enum_validator(enum_name: str, allowed_values: FrozenSet[str], declared: Tuple[str, ...]) -> Callable[[Any], None]:
+    """Build the validator for an enum
+
+    Membership is checked against the set; anything else falls back to
+    validate_enum with the declared values, so errors list them in order.
+    """
+    def validate(value: Any) -> None:
+        if type(value) is not str or value not in allowed_values:
+            validate_enum(value, enum_name, declared)
+    return validate
+
+
+def _run(value: Any, validator: Callable[..., None], path: List[Any]) -> None:
+    """Validate a value with a work-stack validator, without recursing per level
+
+    Entries are popped one at a time; struct validators push their struct-valued
+    children. The ids of the values currently being validated are tracked so a
+    value that contains itself is rejected instead of being walked forever.
+    path is left pointing at the failing value if an error is raised.
+    """
+    stack: List[StackEntry] = [(value, validator, ())]
+    active: Set[int] = set()
+    # Path to the value being validated, extended and trimmed by each
+    # entry's segments. Validators are called with an empty path of their
+    # own, which they leave empty unless they raise.
+    trail: List[Any] = []
+    local: List[Any] = []
+    while stack:
+        value, node, segments = stack.pop()
+        if node is None:
+            active.discard(value)
+            if segments:
+                del trail[-len(segments):]
+            continue
+        trail.extend(segments)
+        key = id(value)
+        if key in active:
+            path[:] = trail
+            raise ValueError("Value contains a reference to itself")
+        active.add(key)
+        # Popped once every child pushed by node has been validated
+        stack.append((key, None, segments))
+        try:
+            node(value, local, stack)
+        except (TypeError, ValueError):
+            path[:] = trail + local
+            raise
+
+
+def _push_array(value: Any, element_validator: Callable[..., None], path: List[Any], stack: List[StackEntry]) -> None:
+    """Check an array of structs, pushing its elements onto the work stack in order"""
+    if type(value) is not list and not isinstance(value, list):
+        raise _type_error('list', value)
+    parents = tuple(path)
+    for i in range(len(value) - 1, -1, -1):
+        stack.append((value[i], element_validator, parents + (i,)))
+
+
+def _push_map(value: Any, value_validator: Callable[..., None], path: List[Any], stack: List[StackEntry]) -> None:
+    """Check a map of structs, pushing its values onto the work stack in order"""
+    if type(value) is not dict and not isinstance(value, dict):
+        raise _type_error('dict', value)
+    if not _STRING_TYPES.issuperset(map(type, value)):
+        key = next(k for k in value if type(k) is not str)
+        raise TypeError(f"Map key must be string, got {type(key).__name__}")
+    parents = tuple(path)
+    items = list(value.items())
+    for key, val in items[::-1]:
+        stack.append((val, value_validator, parents + (key,)))
+
+
+def _missing_or_none(value: Dict[str, Any], field_name: str, struct_name: str, path: List[Any]) -> ValueError:
+    """Build the error for a required field that is absent or None"""
+    if field_name not in value:
+        # Reported against the struct itself, as the field has no value to point at
+        path.pop()
+        return ValueError(f"Missing required field '{field_name}' in struct {struct_name}")
+    return ValueError(f"Field '{field_name}' in struct {struct_name} cannot be None")
+
+
+def _unknown_field(value: Dict[str, Any], known: FrozenSet[str], struct_name: str) -> ValueError:
+    """Build the error for a struct value containing an undeclared field"""
+    field_name = next(k for k in value if k not in known)
+    return ValueError(f"Unknown field '{field_name}' in struct {struct_name}")
+
+
+# Helpers called from the generated struct functions
+_STRUCT_GLOBALS: Dict[str, Any] = {
+    '_type_error': _type_error,
+    '_unknown_field': _unknown_field,
+    '_missing_or_none': _missing_or_none,
+}
+
+
+def _cycle_validator(struct_name: str, all_structs: Dict[str, Any]) -> Callable[[Any], None]:
+    """Build the validator for a struct whose extends chain is cyclic, which always fails"""
+    def invalid(value: Any) -> None:
+        raise extends_cycle_error(struct_name, all_structs)
+    return invalid
+
+
+def _resolve_user_type(type_name: str, schema: CompiledSchema) -> Optional[Tuple[Callable[..., None], int]]:
+    """Resolve a struct or enum name on first use, or return None if it is undefined
+
+    A struct is given its function name and queued on schema.pending; until
+    it is compiled, its validator looks the function up by name.
+    Structs take precedence over enums with the same name.
+    """
+    if schema.all_structs.get(type_name):
+        try:
+            get_struct_fields(type_name, schema.all_structs)
+        except SchemaError:
+            return _cycle_validator(type_name, schema.all_structs), _LEAF
+        func_name = f'_validate_{len(schema.function_names)}_' + re.sub(r'\W', '_', type_name)
+        schema.function_names[type_name] = schema.pending[type_name] = func_name
+        struct_validator = _struct_ref(type_name, schema)
+        return lambda v, path, stack: struct_validator()(v, path, stack), _STRUCT
+    enum_def = schema.all_enums.get(type_name)
+    if enum_def:
+        # Listed in declaration order in error messages
+        names = tuple(v['name'] for v in enum_def.get('values', []))
+        return _enum_validator(type_name, frozenset(names), names), _LEAF
+    return None
+
+
+def _compile_reachable(type_def: Dict[str, Any], schema: CompiledSchema) -> Tuple[Callable[..., None], int]:
+    """Compile a type definition together with every struct it can reach
+
+    Returns the same as _compile_type, but a struct type resolves to its
+    generated function.
+    """
+    validator, kind = _compile_type(type_def, schema)
+    if schema.pending:
+        for name, struct_validator in _compile_structs(schema, schema.pending, schema.namespace).items():
+            schema.resolved_types[name] = (struct_validator, _STRUCT)
+    if kind == _STRUCT:
+        validator = schema.resolved_types[type_def['userDefined']][0]
+    return validator, kind
+
+
+def _struct_ref(struct_name: str, schema: CompiledSchema) -> Callable[[], Callable[..., None]]:
+    """Return a function that looks up a struct's generated function by name
+
+    Struct references are compiled before the struct functions exist, so
+    they are resolved when first called.
+    """
+    func_name = schema.function_names[struct_name]
+    namespace = schema.namespace
+    return lambda: namespace[func_name]
+
+
+def _compile_type(type_def: Dict[str, Any], schema: CompiledSchema) -> Tuple[Callable[..., None], int]:
+    """Resolve a type definition to a validator for non-None values
+
+    Returns the validator and its kind (_LEAF, _NODE, _NESTED or _STRUCT),
+    which says how it is called.
+    """
+    kind = type_def.get('builtIn')
+    if kind is not None:
+        builtin_validator = _BUILTIN.get(kind)
+        if builtin_validator is not None:
+            return builtin_validator, _LEAF
+        message = f"Invalid type definition: {type_def}"
+    elif type_def.get('userDefined'):
+        user_type = type_def['userDefined']
+        resolved = schema.resolved_types.get(user_type)
+        if resolved is not None:
+            return resolved
+        resolved = _resolve_user_type(user_type, schema)
+        if resolved is not None:
+            schema.resolved_types[user_type] = resolved
+            return resolved
+        message = f"Unknown user-defined type: {user_type}"
+    elif type_def.get('array'):
+        element_validator, element_kind = _compile_type(type_def['array'], schema)
+        if element_kind == _STRUCT:
+            struct_validator = _struct_ref(type_def['array']['userDefined'], schema)
+            return lambda v, path, stack: _push_array(v, struct_validator(), path, stack), _NESTED
+        if element_kind != _LEAF:
+            return lambda v, path, stack: _check_array(v, element_validator, (path, stack), path), element_kind
+        return lambda v, path, stack: _check_array(v, element_validator, (), path), _NODE
+    elif type_def.get('mapValue'):
+        value_validator, value_kind = _compile_type(type_def['mapValue'], schema)
+        if value_kind == _STRUCT:
+            struct_validator = _struct_ref(type_def['mapValue']['userDefined'], schema)
+            return lambda v, path, stack: _push_map(v, struct_validator(), path, stack), _NESTED
+        if value_kind != _LEAF:
+            return lambda v, path, stack: _check_map(v, value_validator, (path, stack), path), value_kind
+        return lambda v, path, stack: _check_map(v, value_validator, (), path), _NODE
+    else:
+        message = f"Invalid type definition: {type_def}"
+
+    def invalid(v: Any) -> None:
+        raise ValueError(message)
+    return invalid, _LEAF
 
 
 def validate_type(
@@ -104,50 +577,49 @@ def validate_type(
     type_def: Dict[str, Any],
     all_structs: Dict[str, Any],
     all_enums: Dict[str, Any],
-    is_optional: bool = False
+    is_optional: bool = False,
+    strict: bool = False
 ) -> None:
-    """Validate a value against a type definition"""
-    # Handle optional types
+    """Validate a value against a type definition
+
+    Nested structs are validated from an explicit work stack rather than by
+    recursion, so arbitrarily deep values do not hit the recursion limit and
+    a value that contains itself raises a ValueError.
+
+    Errors inside arrays, maps and structs are reported as a ValueError
+    prefixed with the JSON pointer of the failing value, e.g. /users/3/email.
+    If strict is True, struct values may not contain undeclared fields.
+    The schema is snapshotted on first use; see prepare_schema.
+    """
     if value is None:
+        # Handle optional types
         if is_optional:
             return
-        else:
-            raise ValueError("Value cannot be None for non-optional type")
-    
-    # Built-in types
-    if type_def.get('builtIn') == 'string':
-        validate_string(value)
-    elif type_def.get('builtIn') == 'int':
-        validate_int(value)
-    elif type_def.get('builtIn') == 'float':
-        validate_float(value)
-    elif type_def.get('builtIn') == 'bool':
-        validate_bool(value)
-    # Array types
-    elif type_def.get('array'):
-        element_type = type_def['array']
-        element_validator = lambda v: validate_type(v, element_type, all_structs, all_enums, False)
-        validate_array(value, element_validator)
-    # Map types
-    elif type_def.get('mapValue'):
-        value_type = type_def['mapValue']
-        value_validator = lambda v: validate_type(v, value_type, all_structs, all_enums, False)
-        validate_map(value, value_validator)
-    # User-defined types
-    elif type_def.get('userDefined'):
-        user_type = type_def['userDefined']
-        # Check if it's a struct
-        struct_def = find_struct(user_type, all_structs)
-        if struct_def:
-            validate_struct(value, user_type, struct_def, all_structs, all_enums)
-        # Check if it's an enum
-        else:
-            enum_def = find_enum(user_type, all_enums)
-            if enum_def:
-                allowed_values = [v['name'] for v in enum_def.get('values', [])]
-                validate_enum(value, user_type, allowed_values)
-            else:
-                raise ValueError(f"Unknown user-defined type: {user_type}")
-    else:
-        raise ValueError(f"Invalid type definition: {type_def}")
+        raise ValueError("Value cannot be None for non-optional type")
+
+    # Built-in types, the common case for parameters, need no schema
+    builtin_validator = _BUILTIN.get(type_def.get('builtIn', ''))
+    if builtin_validator is not None:
+        builtin_validator(value)
+        return
 
+    schema = prepare_schema(all_structs, all_enums, strict)
+    entry = schema.compiled_types.get(id(type_def))
+    if entry is None:
+        entry = (type_def, *_compile_reachable(type_def, schema))
+        if len(schema.compiled_types) >= _MAX_COMPILED_TYPES:
+            del schema.compiled_types[next(iter(schema.compiled_types))]
+        schema.compiled_types[id(type_def)] = entry
+    validator, kind = entry[1], entry[2]
+    if kind == _LEAF:
+        validator(value)
+        return
+    path: List[Any] = []
+    try:
+        # The work stack is only needed when a struct can be reached
+        if kind == _NODE:
+            validator(value, path, _NO_STACK)
+        else:
+            _run(value, validator, path)
+    except (TypeError, ValueError) as e:
+        _raise_at(path, e)
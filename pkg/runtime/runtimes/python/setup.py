@@ -1,13 +1,26 @@
 """Setup configuration for pulserpc Python runtime"""
 
+import os
+
 from setuptools import setup, find_packages
 
+# Optionally compile the validation modules to C extensions with mypyc.
+# The pure-Python modules are always shipped and used when no extension is built.
+ext_modules = []
+if os.environ.get("PULSERPC_MYPYC") == "1":
+    from mypyc.build import mypycify
+    ext_modules = mypycify([
+        "pulserpc/types.py",
+        "pulserpc/validation.py",
+    ])
+
 setup(
     name="pulserpc",
     version="0.1.0",
     description="PulseRPC Python Runtime Library",
     author="PulseRPC",
     packages=find_packages(),
+    ext_modules=ext_modules,
     python_requires=">=3.7",
     classifiers=[
         "Programming Language :: Python :: 3",
@@ -18,4 +31,3 @@ setup(
         "Programming Language :: Python :: 3.11",
     ],
 )
-
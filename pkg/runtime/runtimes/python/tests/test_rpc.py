@@ -27,3 +27,11 @@ def test_rpc_error_string_representation():
     assert "-32601" in str(error)
     assert "Method not found" in str(error)
 
+
+
+def test_rpc_error_slots():
+    """Test RPCError stores its fields in slots"""
+    error = RPCError(-32602, "Invalid params", [1])
+    assert 'code' not in error.__dict__
+    assert error.args == ("RPCError -32602: Invalid params",)
+    assert str(error) == "RPCError -32602: Invalid params"
@@ -1,6 +1,8 @@
 """Tests for type helper functions"""
 
-from pulserpc import find_struct, find_enum, get_struct_fields
+import pytest
+from pulserpc import find_struct, find_enum, get_struct_fields, clear_field_cache, SchemaError
+from pulserpc.types import resolve_extends
 
 
 def test_find_struct():
@@ -77,3 +79,96 @@ def test_get_struct_fields_override_parent():
     assert fields[0]['type']['builtIn'] == 'int'
     assert fields[1]['name'] == 'name'
 
+
+
+def test_get_struct_fields_cached():
+    all_structs = {
+        'User': {
+            'fields': [
+                {'name': 'id', 'type': {'builtIn': 'string'}},
+            ]
+        }
+    }
+    fields = get_struct_fields('User', all_structs)
+    assert get_struct_fields('User', all_structs) is fields
+    
+    clear_field_cache()
+    refreshed = get_struct_fields('User', all_structs)
+    assert refreshed is not fields
+    assert refreshed == fields
+
+
+
+def test_get_struct_fields_added_struct():
+    all_structs = {'A': {'fields': []}}
+    assert get_struct_fields('A', all_structs) == []
+    
+    all_structs['B'] = {'fields': [{'name': 'id', 'type': {'builtIn': 'string'}}]}
+    assert [f['name'] for f in get_struct_fields('B', all_structs)] == ['id']
+
+
+def test_get_struct_fields_cache_is_bounded():
+    from pulserpc import types
+    
+    for _ in range(types._MAX_FIELDS_CACHE + 10):
+        get_struct_fields('User', {'User': {'fields': []}})
+    assert len(types._FIELDS_CACHE) <= types._MAX_FIELDS_CACHE
+
+
+def test_get_struct_fields_multi_level_override():
+    all_structs = {
+        'Base': {
+            'fields': [
+                {'name': 'id', 'type': {'builtIn': 'string'}},
+                {'name': 'created', 'type': {'builtIn': 'int'}},
+            ]
+        },
+        'Middle': {
+            'extends': 'Base',
+            'fields': [
+                {'name': 'name', 'type': {'builtIn': 'string'}},
+            ]
+        },
+        'User': {
+            'extends': 'Middle',
+            'fields': [
+                {'name': 'created', 'type': {'builtIn': 'float'}},  # Override grandparent
+                {'name': 'email', 'type': {'builtIn': 'string'}},
+            ]
+        }
+    }
+    fields = get_struct_fields('User', all_structs)
+    assert [f['name'] for f in fields] == ['id', 'created', 'name', 'email']
+    assert fields[1]['type']['builtIn'] == 'float'
+
+
+def test_get_struct_fields_cyclic_extends():
+    all_structs = {
+        'A': {'extends': 'B', 'fields': []},
+        'B': {'extends': 'A', 'fields': []},
+    }
+    all_structs['C'] = {'extends': 'A', 'fields': []}
+    all_structs['D'] = {'fields': [{'name': 'id', 'type': {'builtIn': 'string'}}]}
+    with pytest.raises(SchemaError, match="Struct A has a cyclic extends chain: A -> B -> A"):
+        get_struct_fields('A', all_structs)
+    
+    # Only the structs on the cycle are named, and unrelated structs still resolve
+    with pytest.raises(SchemaError, match="Struct C has a cyclic extends chain: A -> B -> A$"):
+        get_struct_fields('C', all_structs)
+    assert [f['name'] for f in get_struct_fields('D', all_structs)] == ['id']
+    assert list(resolve_extends(all_structs)) == ['D']
+
+
+def test_resolve_extends():
+    all_structs = {
+        'Child': {'extends': 'Parent', 'fields': [{'name': 'a', 'type': {'builtIn': 'int'}}]},
+        'Parent': {'extends': 'Base', 'fields': [{'name': 'b', 'type': {'builtIn': 'string'}}]},
+        'Base': {'fields': [{'name': 'a', 'type': {'builtIn': 'string'}}]},
+        'Orphan': {'extends': 'Missing', 'fields': []},
+    }
+    resolved = resolve_extends(all_structs)
+    
+    # Parents are resolved before the structs extending them
+    assert list(resolved) == ['Base', 'Orphan', 'Parent', 'Child']
+    assert [(f['name'], f['type']['builtIn']) for f in resolved['Child']] == [('a', 'int'), ('b', 'string')]
+    assert resolved['Orphan'] == []
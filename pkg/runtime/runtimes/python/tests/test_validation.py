@@ -1,5 +1,8 @@
 """Tests for validation functions"""
 
+import sys
+import tracemalloc
+
 import pytest
 from pulserpc import (
     validate_string,
@@ -11,6 +14,10 @@ from pulserpc import (
     validate_enum,
     validate_struct,
     validate_type,
+    compile_struct,
+    prepare_schema,
+    clear_schema_cache,
+    SchemaError,
 )
 
 
@@ -37,6 +44,8 @@ class TestBuiltInTypes:
             validate_int("123")
         with pytest.raises(TypeError, match="Expected int"):
             validate_int(3.14)
+        with pytest.raises(TypeError, match="Expected int"):
+            validate_int(True)
     
     def test_validate_float_success(self):
         validate_float(3.14)
@@ -48,6 +57,8 @@ class TestBuiltInTypes:
             validate_float("3.14")
         with pytest.raises(TypeError, match="Expected float"):
             validate_float(None)
+        with pytest.raises(TypeError, match="Expected float"):
+            validate_float(False)
     
     def test_validate_bool_success(self):
         validate_bool(True)
@@ -58,6 +69,24 @@ class TestBuiltInTypes:
             validate_bool(1)
         with pytest.raises(TypeError, match="Expected bool"):
             validate_bool("true")
+        with pytest.raises(TypeError, match="Expected bool"):
+            validate_bool(0)
+    
+    def test_bool_is_not_a_number(self):
+        all_structs = {
+            'Item': {
+                'fields': [
+                    {'name': 'count', 'type': {'builtIn': 'int'}, 'optional': False},
+                    {'name': 'price', 'type': {'builtIn': 'float'}, 'optional': True},
+                ]
+            }
+        }
+        with pytest.raises(ValueError, match="Invalid value at /count: Expected int, got bool"):
+            validate_type({'count': True}, {'userDefined': 'Item'}, all_structs, {})
+        with pytest.raises(ValueError, match="Invalid value at /price: Expected float, got bool"):
+            validate_type({'count': 1, 'price': False}, {'userDefined': 'Item'}, all_structs, {})
+        with pytest.raises(ValueError, match="Invalid value at /1: Expected int, got bool"):
+            validate_type([1, True], {'array': {'builtIn': 'int'}}, {}, {})
 
 
 class TestArrayValidation:
@@ -77,8 +106,23 @@ class TestArrayValidation:
     
     def test_validate_array_element_validation_fails(self):
         element_validator = lambda v: validate_string(v)
-        with pytest.raises(ValueError, match="Array element at index 1"):
+        with pytest.raises(ValueError, match="Invalid value at /1: Expected string"):
             validate_array(["a", 123, "c"], element_validator)
+    
+    def test_validate_array_builtin_elements(self):
+        validate_array(list(range(100)), validate_int)
+        validate_array([1, 2.5, 3], validate_float)
+        validate_array([True, False], validate_bool)
+        with pytest.raises(ValueError, match="Invalid value at /70: Expected int, got bool"):
+            validate_array(list(range(70)) + [True], validate_int)
+        with pytest.raises(ValueError, match="Invalid value at /1: Expected string, got int"):
+            validate_array(["a", 1], validate_string)
+    
+    def test_validate_array_validator_args(self):
+        type_def = {'builtIn': 'int'}
+        validate_array([1, 2], validate_type, type_def, {}, {}, False)
+        with pytest.raises(ValueError, match="Invalid value at /0: Value cannot be None"):
+            validate_array([None], validate_type, type_def, {}, {}, False)
 
 
 class TestMapValidation:
@@ -100,11 +144,25 @@ class TestMapValidation:
         value_validator = lambda v: validate_int(v)
         with pytest.raises(TypeError, match="Map key must be string"):
             validate_map({123: 1}, value_validator)
+        with pytest.raises(TypeError, match="Map key must be string, got int"):
+            validate_map({"a": 1, 2: 2}, validate_int)
+    
+    def test_validate_map_builtin_values(self):
+        validate_map({"a": 1, "b": 2}, validate_int)
+        validate_map({"a": 1, "b": 2.5}, validate_float)
+        with pytest.raises(ValueError, match="Invalid value at /c: Expected int, got bool"):
+            validate_map({"a": 1, "b": 2, "c": True}, validate_int)
     
     def test_validate_map_value_validation_fails(self):
         value_validator = lambda v: validate_int(v)
-        with pytest.raises(ValueError, match="Map value for key 'a'"):
+        with pytest.raises(ValueError, match="Invalid value at /a: Expected int"):
             validate_map({"a": "not an int"}, value_validator)
+    
+    def test_validate_map_validator_args(self):
+        type_def = {'builtIn': 'string'}
+        validate_map({"a": "x"}, validate_type, type_def, {}, {}, False)
+        with pytest.raises(ValueError, match="Invalid value at /b: Expected string"):
+            validate_map({"a": "x", "b": 1}, validate_type, type_def, {}, {}, False)
 
 
 class TestEnumValidation:
@@ -121,6 +179,20 @@ class TestEnumValidation:
     def test_validate_enum_invalid_value(self):
         with pytest.raises(ValueError, match="Invalid value for enum"):
             validate_enum("invalid", "Platform", ["kindle", "nook"])
+    
+    def test_validate_enum_frozenset(self):
+        allowed_values = frozenset(["kindle", "nook"])
+        validate_enum("kindle", "Platform", allowed_values)
+        with pytest.raises(ValueError, match=r"Allowed values: \['kindle', 'nook'\]"):
+            validate_enum("kobo", "Platform", allowed_values)
+    
+    def test_validate_enum_declaration_order(self):
+        all_enums = {'Platform': {'values': [{'name': 'nook'}, {'name': 'kindle'}]}}
+        validate_type('kindle', {'userDefined': 'Platform'}, {}, all_enums)
+        with pytest.raises(ValueError, match=r"Allowed values: \['nook', 'kindle'\]"):
+            validate_type('kobo', {'userDefined': 'Platform'}, {}, all_enums)
+        with pytest.raises(TypeError, match="Expected string for enum Platform"):
+            validate_type(1, {'userDefined': 'Platform'}, {}, all_enums)
 
 
 class TestStructValidation:
@@ -213,6 +285,207 @@ class TestStructValidation:
         # Should fail if parent field missing
         with pytest.raises(ValueError, match="Missing required field"):
             validate_struct({'name': 'Alice'}, 'User', struct_def, all_structs, all_enums)
+    
+    def test_validate_struct_none_required_field(self):
+        all_structs = {
+            'User': {
+                'fields': [
+                    {'name': 'id', 'type': {'builtIn': 'string'}, 'optional': False},
+                ]
+            }
+        }
+        with pytest.raises(ValueError, match="Field 'id' in struct User cannot be None"):
+            validate_struct({'id': None}, 'User', all_structs['User'], all_structs, {})
+    
+    def test_validate_struct_strict(self):
+        all_structs = {
+            'User': {
+                'fields': [
+                    {'name': 'id', 'type': {'builtIn': 'string'}, 'optional': False},
+                    {'name': 'email', 'type': {'builtIn': 'string'}, 'optional': True},
+                ]
+            }
+        }
+        struct_def = all_structs['User']
+        value = {'id': '123', 'nickname': 'al'}
+        
+        # Undeclared fields are ignored unless strict
+        validate_struct(value, 'User', struct_def, all_structs, {})
+        with pytest.raises(ValueError, match="Unknown field 'nickname' in struct User"):
+            validate_struct(value, 'User', struct_def, all_structs, {}, strict=True)
+        with pytest.raises(ValueError, match="Invalid value at /0: Unknown field 'nickname'"):
+            validate_type([value], {'array': {'userDefined': 'User'}}, all_structs, {}, strict=True)
+        validate_struct({'id': '123', 'email': 'a@example.com'}, 'User', struct_def, all_structs, {}, strict=True)
+
+
+class TestCompiledStruct:
+    """Test compiled struct validators"""
+    
+    def test_compile_struct_is_cached(self):
+        all_structs = {
+            'User': {
+                'fields': [
+                    {'name': 'id', 'type': {'builtIn': 'string'}, 'optional': False},
+                ]
+            }
+        }
+        all_enums = {}
+        validator = compile_struct('User', all_structs, all_enums)
+        assert compile_struct('User', all_structs, all_enums) is validator
+        validator({'id': '123'})
+        with pytest.raises(ValueError, match="Invalid value at /id: Expected string"):
+            validator({'id': 123})
+    
+    def test_compile_struct_nested_and_recursive(self):
+        all_structs = {
+            'Node': {
+                'fields': [
+                    {'name': 'kind', 'type': {'userDefined': 'Kind'}, 'optional': False},
+                    {'name': 'children', 'type': {'array': {'userDefined': 'Node'}}, 'optional': True},
+                ]
+            }
+        }
+        all_enums = {'Kind': {'values': [{'name': 'leaf'}, {'name': 'branch'}]}}
+        validator = compile_struct('Node', all_structs, all_enums)
+        validator({'kind': 'branch', 'children': [{'kind': 'leaf'}, {'kind': 'leaf', 'children': None}]})
+        with pytest.raises(ValueError, match="Invalid value for enum Kind"):
+            validator({'kind': 'branch', 'children': [{'kind': 'trunk'}]})
+        with pytest.raises(ValueError, match="Invalid value at /children/0: Expected dict for struct Node"):
+            validator({'kind': 'branch', 'children': [None]})
+    
+    def test_compile_struct_dotted_name(self):
+        all_structs = {
+            'inc.Response': {
+                'fields': [
+                    {'name': 'status', 'type': {'builtIn': 'string'}},
+                ]
+            }
+        }
+        validator = compile_struct('inc.Response', all_structs, {})
+        validator({'status': 'ok'})
+        with pytest.raises(TypeError, match="Expected dict for struct inc.Response"):
+            validator([])
+
+
+class TestPrepareSchema:
+    """Test schema preparation"""
+    
+    def test_prepare_schema_fields(self):
+        all_structs = {
+            'Base': {
+                'fields': [
+                    {'name': 'id', 'type': {'builtIn': 'string'}},
+                ]
+            },
+            'User': {
+                'extends': 'Base',
+                'fields': [
+                    {'name': 'email', 'type': {'builtIn': 'string'}, 'optional': True},
+                    {'name': 'friends', 'type': {'array': {'userDefined': 'User'}}},
+                ]
+            }
+        }
+        all_enums = {'Platform': {'values': [{'name': 'kindle'}, {'name': 'nook'}]}}
+        schema = prepare_schema(all_structs, all_enums)
+        assert prepare_schema(all_structs, all_enums) is schema
+        
+        # Inherited and recursive fields are validated through the prepared schema
+        validate_type({'id': 'a', 'friends': [{'id': 'b', 'friends': []}]}, {'userDefined': 'User'}, all_structs, all_enums)
+        with pytest.raises(ValueError, match="Invalid value at /friends/0/id: Expected string"):
+            validate_type({'id': 'a', 'friends': [{'id': 1, 'friends': []}]}, {'userDefined': 'User'}, all_structs, all_enums)
+        with pytest.raises(ValueError, match="Invalid value for enum Platform"):
+            validate_type('kobo', {'userDefined': 'Platform'}, all_structs, all_enums)
+        with pytest.raises(ValueError, match="Missing required field 'friends'"):
+            validate_type({'id': 'a', 'email': None}, {'userDefined': 'User'}, all_structs, all_enums)
+        with pytest.raises(ValueError, match="Invalid value at /email: Expected string"):
+            validate_type({'id': 'a', 'email': 1, 'friends': []}, {'userDefined': 'User'}, all_structs, all_enums)
+    
+    def test_prepare_schema_compiles_reachable_structs(self):
+        all_structs = {
+            'User': {
+                'fields': [
+                    {'name': 'address', 'type': {'userDefined': 'Address'}},
+                    {'name': 'tags', 'type': {'mapValue': {'userDefined': 'Tag'}}},
+                ]
+            },
+            'Address': {'fields': [{'name': 'city', 'type': {'builtIn': 'string'}}]},
+            'Tag': {'fields': []},
+            'Order': {'fields': [{'name': 'user', 'type': {'userDefined': 'User'}}]},
+        }
+        all_enums = {'Platform': {'values': [{'name': 'kindle'}]}}
+        schema = prepare_schema(all_structs, all_enums)
+        
+        validate_type({'address': {'city': 'x'}, 'tags': {}}, {'userDefined': 'User'}, all_structs, all_enums)
+        assert set(schema.function_names) == {'User', 'Address', 'Tag'}
+        assert set(schema.resolved_types) == {'User', 'Address', 'Tag'}
+        assert not schema.pending
+        
+        with pytest.raises(ValueError, match="Invalid value at /user/address/city"):
+            validate_type({'user': {'address': {'city': 1}, 'tags': {}}}, {'userDefined': 'Order'}, all_structs, all_enums)
+        assert set(schema.function_names) == {'User', 'Address', 'Tag', 'Order'}
+    
+    def test_prepare_schema_struct_references(self):
+        all_structs = {
+            'Node': {
+                'fields': [
+                    {'name': 'next', 'type': {'userDefined': 'Node'}, 'optional': True},
+                    {'name': 'owner', 'type': {'userDefined': 'User'}, 'optional': True},
+                ]
+            },
+            'User': {'fields': [{'name': 'id', 'type': {'builtIn': 'string'}}]},
+        }
+        # A struct takes precedence over an enum with the same name
+        all_enums = {'User': {'values': [{'name': 'admin'}]}}
+        
+        validate_type({'next': {'owner': {'id': 'a'}}}, {'userDefined': 'Node'}, all_structs, all_enums)
+        with pytest.raises(ValueError, match="Invalid value at /next/owner/id"):
+            validate_type({'next': {'owner': {'id': 1}}}, {'userDefined': 'Node'}, all_structs, all_enums)
+        with pytest.raises(ValueError, match="Invalid value at /owner: Expected dict for struct User"):
+            validate_type({'owner': 'admin'}, {'userDefined': 'Node'}, all_structs, all_enums)
+    
+    def test_prepare_schema_cyclic_extends(self):
+        all_structs = {
+            'A': {'extends': 'B', 'fields': []},
+            'B': {'extends': 'A', 'fields': []},
+            'C': {'extends': 'A', 'fields': []},
+            'User': {
+                'fields': [
+                    {'name': 'id', 'type': {'builtIn': 'string'}},
+                    {'name': 'c', 'type': {'userDefined': 'C'}, 'optional': True},
+                ]
+            },
+        }
+        all_enums = {}
+        
+        # Only values of the affected structs fail
+        validate_type(1, {'builtIn': 'int'}, all_structs, all_enums)
+        validate_type({'id': 'a'}, {'userDefined': 'User'}, all_structs, all_enums)
+        with pytest.raises(SchemaError, match="Struct C has a cyclic extends chain: A -> B -> A$"):
+            validate_type({}, {'userDefined': 'C'}, all_structs, all_enums)
+        with pytest.raises(SchemaError, match="Struct A has a cyclic extends chain"):
+            compile_struct('A', all_structs, all_enums)
+        # Reported as a schema fault, not against the value
+        with pytest.raises(SchemaError, match="^Struct C has a cyclic extends chain"):
+            validate_type({'id': 'a', 'c': {}}, {'userDefined': 'User'}, all_structs, all_enums)
+    
+    def test_prepare_schema_cache_is_bounded(self):
+        from pulserpc import validation
+        
+        for _ in range(validation._MAX_SCHEMAS * 3):
+            validate_type({}, {'userDefined': 'User'}, {'User': {'fields': []}}, {})
+        assert len(validation._SCHEMAS) <= validation._MAX_SCHEMAS
+    
+    def test_clear_schema_cache(self):
+        all_structs = {'User': {'fields': []}}
+        all_enums = {}
+        validate_type({}, {'userDefined': 'User'}, all_structs, all_enums)
+        
+        # The schema is snapshotted until the cache is cleared
+        all_structs['User']['fields'].append({'name': 'id', 'type': {'builtIn': 'string'}})
+        validate_type({}, {'userDefined': 'User'}, all_structs, all_enums)
+        clear_schema_cache()
+        with pytest.raises(ValueError, match="Missing required field 'id'"):
+            validate_type({}, {'userDefined': 'User'}, all_structs, all_enums)
 
 
 class TestTypeValidation:
@@ -249,3 +522,146 @@ class TestTypeValidation:
         with pytest.raises(ValueError):
             validate_type({"a": "not int"}, type_def, all_structs, all_enums)
 
+    
+    def test_validate_type_user_defined(self):
+        all_structs = {
+            'User': {
+                'fields': [
+                    {'name': 'id', 'type': {'builtIn': 'string'}, 'optional': False},
+                ]
+            }
+        }
+        all_enums = {'Platform': {'values': [{'name': 'kindle'}, {'name': 'nook'}]}}
+        validate_type({'id': '123'}, {'userDefined': 'User'}, all_structs, all_enums)
+        validate_type('nook', {'userDefined': 'Platform'}, all_structs, all_enums)
+        
+        with pytest.raises(ValueError, match="Invalid value for enum Platform"):
+            validate_type('kobo', {'userDefined': 'Platform'}, all_structs, all_enums)
+        with pytest.raises(ValueError, match="Unknown user-defined type: Missing"):
+            validate_type('x', {'userDefined': 'Missing'}, all_structs, all_enums)
+    
+    def test_validate_type_invalid_definition(self):
+        with pytest.raises(ValueError, match="Invalid type definition"):
+            validate_type('x', {'builtIn': 'decimal'}, {}, {})
+        with pytest.raises(ValueError, match="Invalid type definition"):
+            validate_type('x', {}, {}, {})
+
+    def test_validate_type_error_path(self):
+        all_structs = {
+            'User': {
+                'fields': [
+                    {'name': 'email', 'type': {'builtIn': 'string'}, 'optional': False},
+                    {'name': 'tags', 'type': {'mapValue': {'builtIn': 'int'}}, 'optional': True},
+                ]
+            }
+        }
+        type_def = {'mapValue': {'array': {'userDefined': 'User'}}}
+        validate_type({'users': [{'email': 'a@example.com', 'tags': {'x': 1}}]}, type_def, all_structs, {})
+        
+        with pytest.raises(ValueError, match="Invalid value at /users/1/email: Expected string, got int"):
+            validate_type({'users': [{'email': 'a'}, {'email': 3}]}, type_def, all_structs, {})
+        with pytest.raises(ValueError, match="Invalid value at /users/0/tags/a~1b: Expected int"):
+            validate_type({'users': [{'email': 'a', 'tags': {'a/b': 'x'}}]}, type_def, all_structs, {})
+        with pytest.raises(ValueError, match="Invalid value at /users/0: Missing required field 'email'"):
+            validate_type({'users': [{}]}, type_def, all_structs, {})
+        
+        # Top-level errors are raised unchanged
+        with pytest.raises(TypeError, match="Expected dict, got list"):
+            validate_type([], type_def, all_structs, {})
+
+    def test_validate_type_deep_nesting(self):
+        all_structs = {
+            'Node': {
+                'fields': [
+                    {'name': 'value', 'type': {'builtIn': 'int'}, 'optional': False},
+                    {'name': 'children', 'type': {'array': {'userDefined': 'Node'}}, 'optional': True},
+                ]
+            }
+        }
+        depth = sys.getrecursionlimit() * 2
+        value = {'value': 0}
+        for i in range(depth):
+            value = {'value': i, 'children': [value]}
+        validate_type(value, {'userDefined': 'Node'}, all_structs, {})
+        
+        leaf = value
+        while 'children' in leaf:
+            leaf = leaf['children'][0]
+        leaf['value'] = 'x'
+        with pytest.raises(ValueError, match=r"Invalid value at (/children/0){%d}/value: Expected int" % depth):
+            validate_type(value, {'userDefined': 'Node'}, all_structs, {})
+
+    def test_validate_type_deep_nesting_is_linear(self):
+        all_structs = {
+            'Node': {
+                'fields': [
+                    {'name': 'children', 'type': {'array': {'userDefined': 'Node'}}, 'optional': True},
+                ]
+            }
+        }
+        all_enums = {}
+        
+        def peak_memory(depth):
+            value = {}
+            for _ in range(depth):
+                value = {'children': [value]}
+            tracemalloc.start()
+            try:
+                validate_type(value, {'userDefined': 'Node'}, all_structs, all_enums)
+                return tracemalloc.get_traced_memory()[1]
+            finally:
+                tracemalloc.stop()
+        
+        validate_type({}, {'userDefined': 'Node'}, all_structs, all_enums)
+        depth = sys.getrecursionlimit() * 5
+        # Quadrupling the depth would multiply a per-entry path copy's cost by 16
+        assert peak_memory(depth * 4) < peak_memory(depth) * 6
+
+    def test_validate_type_cyclic_value(self):
+        all_structs = {
+            'Node': {
+                'fields': [
+                    {'name': 'next', 'type': {'userDefined': 'Node'}, 'optional': True},
+                ]
+            }
+        }
+        value = {}
+        value['next'] = {'next': value}
+        with pytest.raises(ValueError, match="Invalid value at /next/next: Value contains a reference to itself"):
+            validate_type(value, {'userDefined': 'Node'}, all_structs, {})
+        
+        # The same value may appear more than once without forming a cycle
+        shared = {}
+        validate_type([shared, shared], {'array': {'userDefined': 'Node'}}, all_structs, {})
+
+    def test_validate_type_reports_first_failing_element(self):
+        all_structs = {
+            'User': {
+                'fields': [
+                    {'name': 'email', 'type': {'builtIn': 'string'}, 'optional': False},
+                ]
+            }
+        }
+        with pytest.raises(ValueError, match="Invalid value at /1/email"):
+            validate_type([{'email': 'a'}, {'email': 1}, {'email': 2}], {'array': {'userDefined': 'User'}}, all_structs, {})
+
+    def test_validate_type_nested_containers(self):
+        all_structs = {
+            'User': {
+                'fields': [
+                    {'name': 'email', 'type': {'builtIn': 'string'}, 'optional': False},
+                ]
+            }
+        }
+        all_enums = {}
+        strings = {'array': {'array': {'builtIn': 'string'}}}
+        users = {'mapValue': {'array': {'userDefined': 'User'}}}
+        
+        # Repeated calls reuse the compiled type definition
+        for _ in range(2):
+            validate_type([['a'], []], strings, all_structs, all_enums)
+            with pytest.raises(ValueError, match="Invalid value at /1/0: Expected string"):
+                validate_type([['a'], [1]], strings, all_structs, all_enums)
+            validate_type({'a': [{'email': 'x'}]}, users, all_structs, all_enums)
+            with pytest.raises(ValueError, match="Invalid value at /a/1: Missing required field .email."):
+                validate_type({'a': [{'email': 'x'}, {}]}, users, all_structs, all_enums)